@@ -14,6 +14,9 @@ import uuid
 
 router = APIRouter()
 
+# Upper bound on the number of distinct source documents returned as groups
+MAX_GROUPS = 10000
+
 class ConsolidateRequest(BaseModel):
     """
     Request model for the consolidation endpoint.
@@ -37,32 +40,27 @@ async def consolidate_memories(request: ConsolidateRequest):
     (e.g., DBSCAN) to group thematically similar chunks across different documents.
     """
     
-    # Fetch recent vectors from the database
-    # Using 'scroll' to retrieve a batch of points with their payloads
-    points, _ = memory_service.client.scroll(
+    # Group chunks by their source filename
+    # The facet query counts chunks per distinct filename inside Qdrant using the
+    # payload index, so no chunk payloads need to be transferred.
+    facet = memory_service.client.facet(
         collection_name="legal_memory",
-        limit=100,
-        with_payload=True
+        key="filename",
+        limit=MAX_GROUPS,
+        exact=True
     )
-    
-    # Group chunks by their source filename
-    groups = {}
-    for p in points:
-        filename = p.payload["filename"]
-        if filename not in groups:
-            groups[filename] = []
-        groups[filename].append(p.payload["text"])
         
     consolidated_memories = []
-    for filename, texts in groups.items():
+    for hit in facet.hits:
+        filename, member_count = hit.value, hit.count
         # Generate a summary for the group
         # Future enhancement: Use LLM to generate a semantic summary of the grouped texts
-        summary = f"Consolidated memory of {len(texts)} chunks from {filename}."
+        summary = f"Consolidated memory of {member_count} chunks from {filename}."
         
         consolidated_memories.append({
             "id": str(uuid.uuid4()),
             "summary": summary,
-            "member_count": len(texts),
+            "member_count": member_count,
             "source": filename
         })
         
@@ -11,7 +11,7 @@ from app.services.ingest import ingest_service
 from app.services.memory import memory_service
 from app.services.llm import llm_service
 from app.models.document import IngestResponse
-import shutil
+import aiofiles
 import os
 import uuid
 
@@ -31,11 +31,10 @@ async def process_upload_background(file_path: str, filename: str):
     chunks = await ingest_service.process_pdf(file_path, filename)
     
     # 2. Enrich with Metadata (LLM)
-    # We iterate through chunks to extract structured data like dates and entities.
-    # Note: In a high-volume production environment, this step should be batched 
-    # or handled by a dedicated metadata extraction service to avoid latency.
-    for chunk in chunks:
-        metadata = await llm_service.extract_metadata(chunk.text)
+    # Extract structured data like dates and entities. Chunks are batched into
+    # a few concurrent LLM calls instead of one round-trip per chunk.
+    metadata_list = await llm_service.extract_metadata_batch([chunk.text for chunk in chunks])
+    for chunk, metadata in zip(chunks, metadata_list):
         chunk.metadata.dates = metadata.get("dates", [])
         chunk.metadata.entities = metadata.get("entities", [])
     
@@ -67,9 +66,10 @@ async def upload_document(
     # Ensure the temporary directory exists
     os.makedirs("raw_documents", exist_ok=True)
     
-    # Save the uploaded file to disk
-    with open(temp_path, "wb") as buffer:
-        shutil.copyfileobj(file.file, buffer)
+    # Stream the uploaded file to disk in 1 MiB chunks without blocking the event loop
+    async with aiofiles.open(temp_path, "wb") as buffer:
+        while chunk := await file.read(1 << 20):
+            await buffer.write(chunk)
         
     # Schedule the background processing task
     background_tasks.add_task(process_upload_background, temp_path, file.filename)
@@ -7,12 +7,15 @@ and specialized views like timelines and semantic graphs.
 """
 
 from fastapi import APIRouter, HTTPException, Query
+from fastapi.responses import StreamingResponse
 from pydantic import BaseModel
 from typing import List, Optional, Dict, Any
+from qdrant_client.http import models
 from app.services.memory import memory_service
 from app.services.llm import llm_service
-from app.services.ingest import embedding_model
-import networkx as nx
+from app.services.ingest import embed_query
+from collections import defaultdict
+import asyncio
 import json
 import uuid
 
@@ -34,18 +37,15 @@ class QueryResponse(BaseModel):
     sources: List[Dict[str, Any]]
     created_memory_id: Optional[str] = None
 
-@router.post("/query", response_model=QueryResponse)
-async def query_memory(request: QueryRequest):
+async def _retrieve_context(query: str):
     """
-    Performs a semantic search and optionally synthesizes an answer using the LLM.
+    Retrieves the chunks most relevant to a query.
 
-    1. Generates an embedding for the user's query.
-    2. Retrieves the most relevant document chunks from the vector database.
-    3. (Optional) Uses the LLM to generate a natural language answer based on the retrieved context.
+    Returns the source citations and the formatted context passages for the LLM.
     """
     # 1. Generate Query Embedding
     # We use the same embedding model as the ingestion service to ensure compatibility
-    query_vector = embedding_model.encode(request.query).tolist()
+    query_vector = embed_query(query)
 
     # 2. Retrieve Relevant Chunks
     results = await memory_service.search(query_vector, limit=5)
@@ -62,6 +62,19 @@ async def query_memory(request: QueryRequest):
         })
         context_chunks.append(f"Source ({payload['filename']} p.{payload['page_number']}): {payload['text']}")
 
+    return sources, context_chunks
+
+@router.post("/query", response_model=QueryResponse)
+async def query_memory(request: QueryRequest):
+    """
+    Performs a semantic search and optionally synthesizes an answer using the LLM.
+
+    1. Generates an embedding for the user's query.
+    2. Retrieves the most relevant document chunks from the vector database.
+    3. (Optional) Uses the LLM to generate a natural language answer based on the retrieved context.
+    """
+    sources, context_chunks = await _retrieve_context(request.query)
+
     # 3. Synthesize Answer (RAG)
     if request.synthesize:
         # Generate answer using the LLM with the retrieved context
@@ -75,6 +88,36 @@ async def query_memory(request: QueryRequest):
     # If synthesis is disabled, return only the sources
     return QueryResponse(answer="", sources=sources)
 
+@router.post("/query/stream")
+async def query_memory_stream(request: QueryRequest):
+    """
+    Performs a semantic search and streams the synthesized answer as Server-Sent Events.
+
+    Events are emitted in order:
+    1. `sources`: the source citations as a JSON list.
+    2. `token`: zero or more answer deltas, each as a JSON object `{"text": ...}`.
+    3. `done`: an empty JSON object once the answer is complete, or
+       `error`: a JSON object `{"message": ...}` if generation failed. Tokens sent
+       before an `error` event are an incomplete answer.
+    """
+    sources, context_chunks = await _retrieve_context(request.query)
+
+    def sse(event: str, data: Any) -> str:
+        return f"event: {event}\ndata: {json.dumps(data)}\n\n"
+
+    async def event_stream():
+        yield sse("sources", sources)
+        if request.synthesize:
+            try:
+                async for text in llm_service.synthesize_answer_stream(request.query, context_chunks):
+                    yield sse("token", {"text": text})
+            except Exception as e:
+                yield sse("error", {"message": f"Error generating answer: {str(e)}"})
+                return
+        yield sse("done", {})
+
+    return StreamingResponse(event_stream(), media_type="text/event-stream")
+
 
 @router.get("/timeline")
 async def get_timeline():
@@ -83,27 +126,26 @@ async def get_timeline():
     
     Returns a list of events sorted by date.
     """
-    # Fetch recent items from the vector database
-    # In a production system, this should be an optimized query for items with date metadata
-    client = memory_service.client
-    results, _ = client.scroll(
-        collection_name="legal_memory",
-        limit=100,
-        with_payload=True
-    )
+    # Fetch all items that have date metadata, using the payload index on "dates".
+    # Only the payload fields needed for the timeline are transferred.
+    # Paging through the collection is blocking, so it runs in a worker thread.
+    results = await asyncio.to_thread(list, memory_service.scroll_all(
+        scroll_filter=models.Filter(
+            must_not=[models.IsEmptyCondition(is_empty=models.PayloadField(key="dates"))]
+        ),
+        with_payload=["dates", "text", "filename"]
+    ))
     
     timeline_events = []
     for res in results:
-        dates = res.payload.get("dates", [])
-        if dates:
-            for date in dates:
-                timeline_events.append({
-                    "date": date,
-                    # Truncate text for the timeline view
-                    "event": res.payload["text"][:100] + "...",
-                    "source": res.payload["filename"],
-                    "chunk_id": res.id
-                })
+        for date in res.payload["dates"]:
+            timeline_events.append({
+                "date": date,
+                # Truncate text for the timeline view
+                "event": res.payload["text"][:100] + "...",
+                "source": res.payload["filename"],
+                "chunk_id": res.id
+            })
     
     # Sort events by date
     # Note: This uses simple string sorting. Robust date parsing is recommended for production.
@@ -121,37 +163,29 @@ async def get_semantic_graph(query: Optional[str] = None):
     limit = 20
     if query:
         # If query provided, get relevant chunks
-        query_vector = embedding_model.encode(query).tolist()
+        query_vector = embed_query(query)
         results = await memory_service.search(query_vector, limit=limit)
         points = [r for r in results]
     else:
         # Otherwise, get a random sample of recent chunks
         points, _ = memory_service.client.scroll(collection_name="legal_memory", limit=limit, with_payload=True)
     
-    # Build the graph using NetworkX
-    G = nx.Graph()
-    
-    # Add nodes (chunks)
+    # Build the graph directly in a format suitable for frontend visualization (e.g., Cytoscape)
+    # Add nodes (chunks), grouping their ids by source filename as we go
+    elements = []
+    by_file = defaultdict(list)
     for p in points:
-        pid = p.id
-        payload = p.payload
-        G.add_node(pid, label=payload["filename"], text=payload["text"][:50])
+        filename = p.payload["filename"]
+        elements.append({"data": {"id": str(p.id), "label": filename}})
+        by_file[filename].append(str(p.id))
         
     # Add edges
     # Currently linking chunks from the same document.
+    # Each unordered pair within a group is linked exactly once.
     # Future enhancement: Link based on semantic similarity or shared entities.
-    for p1 in points:
-        for p2 in points:
-            if p1.id != p2.id:
-                if p1.payload["filename"] == p2.payload["filename"]:
-                    G.add_edge(p1.id, p2.id, weight=0.5)
-                
-    # Convert graph to a format suitable for frontend visualization (e.g., Cytoscape)
-    elements = []
-    for node in G.nodes(data=True):
-        elements.append({"data": {"id": str(node), "label": G.nodes[node]["label"]}})
-        
-    for u, v, data in G.edges(data=True):
-        elements.append({"data": {"source": str(u), "target": str(v)}})
+    for ids in by_file.values():
+        for i in range(len(ids)):
+            for j in range(i + 1, len(ids)):
+                elements.append({"data": {"source": ids[i], "target": ids[j]}})
         
     return elements
@@ -6,6 +6,7 @@ It reads environment variables from a .env file and provides a centralized
 settings object for the application.
 """
 
+import os
 from pydantic_settings import BaseSettings
 
 class Settings(BaseSettings):
@@ -21,6 +22,19 @@ class Settings(BaseSettings):
     # Google Gemini API Key
     GEMINI_API_KEY: str = ""
 
+    # Maximum number of concurrent LLM requests during batched metadata extraction
+    LLM_MAX_CONCURRENCY: int = 4
+
+    # On-disk cache of LLM responses, keyed by prompt hash
+    LLM_CACHE_DIR: str = ".llm_cache"
+    LLM_CACHE_TTL: int = 86400  # seconds
+
+    # Number of CPU threads used by PyTorch for embedding inference
+    TORCH_NUM_THREADS: int = os.cpu_count() or 4
+
+    # On-disk cache of chunk embeddings, keyed by content hash
+    EMBEDDING_CACHE_DIR: str = ".embedding_cache"
+
     class Config:
         env_file = ".env"
         # Case sensitive environment variables
@@ -6,7 +6,8 @@ within the application. It includes models for document metadata, text chunks,
 and API responses.
 """
 
-from pydantic import BaseModel, Field
+import numpy as np
+from pydantic import BaseModel, ConfigDict, Field
 from typing import List, Optional, Dict, Any
 from datetime import datetime
 
@@ -29,10 +30,13 @@ class TextChunk(BaseModel):
     Represents a chunk of text from a document, including its metadata
     and vector embedding.
     """
+    model_config = ConfigDict(arbitrary_types_allowed=True)
+
     text: str
     metadata: DocumentMetadata
     chunk_id: str
-    embedding: Optional[List[float]] = None
+    # Stored as a float32 array; converted only at the vector database boundary
+    embedding: Optional[np.ndarray] = None
 
 class IngestResponse(BaseModel):
     """
@@ -6,18 +6,101 @@ It performs text extraction, chunking, and vector embedding generation to prepar
 documents for indexing in the vector database.
 """
 
+import asyncio
+import bisect
+import functools
+import hashlib
+import os
+import threading
 import uuid
-from typing import List
+from typing import List, Tuple, Dict, Any
 from datetime import datetime
-import pypdf
+from app.core.config import settings
+
+# The OpenMP runtime reads its thread count when first loaded, so this must be
+# set before numpy/torch are imported.
+os.environ.setdefault("OMP_NUM_THREADS", str(settings.TORCH_NUM_THREADS))
+
+import diskcache
+import numpy as np
+import pypdfium2 as pdfium
 from langchain_text_splitters import RecursiveCharacterTextSplitter
+import torch
 from sentence_transformers import SentenceTransformer
 from app.models.document import TextChunk, DocumentMetadata
-from app.core.config import settings
+from app.services.tokenizer import EMBEDDING_MODEL_NAME
+
+# Use every configured core for intra-op parallelism (the attention GEMMs), and a
+# single inter-op thread so concurrent requests don't oversubscribe the CPU.
+torch.set_num_threads(settings.TORCH_NUM_THREADS)
+torch.set_num_interop_threads(1)
+
+# Namespace for deterministic chunk IDs derived from the chunk's source and content
+CHUNK_ID_NAMESPACE = uuid.NAMESPACE_DNS
+
+# Serializes all PDFium calls: the library is not thread-safe (see pypdfium2's
+# "Incompatibility with Threading" limitation).
+_pdfium_lock = threading.Lock()
+
+# Dynamically quantized (int8) ONNX export published alongside the model on the
+# Hugging Face Hub. It is downloaded once and cached on disk by the Hub client.
+ONNX_QUANTIZED_FILE = 'onnx/model_qint8_avx512_vnni.onnx'
+
+def _load_embedding_model() -> Tuple[SentenceTransformer, str]:
+    """
+    Loads the sentence transformer model on the best available backend.
+
+    On GPU the model runs in FP16 so inference can use the tensor cores.
+    On CPU the int8 ONNX Runtime backend is preferred, falling back to the
+    default FP32 PyTorch model if ONNX Runtime is not installed.
+
+    Returns:
+        Tuple[SentenceTransformer, str]: The model and a tag naming its backend and precision.
+    """
+    if torch.cuda.is_available():
+        model = SentenceTransformer(EMBEDDING_MODEL_NAME, device='cuda')
+        return model.half(), 'cuda-fp16'
+
+    try:
+        model = SentenceTransformer(
+            EMBEDDING_MODEL_NAME,
+            backend='onnx',
+            model_kwargs={'file_name': ONNX_QUANTIZED_FILE},
+        )
+        return model, 'onnx-qint8'
+    except Exception as e:
+        print(f"Warning: ONNX backend unavailable, using FP32 PyTorch model: {str(e)}")
+        return SentenceTransformer(EMBEDDING_MODEL_NAME), 'torch-fp32'
 
 # Initialize the sentence transformer model for generating embeddings
-# 'all-mpnet-base-v2' is a high-performing model for semantic search
-embedding_model = SentenceTransformer('all-mpnet-base-v2')
+embedding_model, embedding_backend = _load_embedding_model()
+
+# Content-hash -> embedding cache, so boilerplate clauses repeated across
+# documents are only encoded once. Vectors are stored as FP16 to halve disk usage.
+# Each model and backend gets its own cache, since their outputs differ numerically.
+embedding_cache = diskcache.Cache(
+    os.path.join(settings.EMBEDDING_CACHE_DIR, EMBEDDING_MODEL_NAME, embedding_backend)
+)
+
+@functools.lru_cache(maxsize=4096)
+def _embed_normalized_query(key: str) -> np.ndarray:
+    vector = embedding_model.encode(key, normalize_embeddings=True, convert_to_numpy=True).astype(np.float32)
+    # Cached arrays are shared between callers, so they must not be mutated
+    vector.flags.writeable = False
+    return vector
+
+def embed_query(text: str) -> np.ndarray:
+    """
+    Generates the embedding for a search query, memoized on the normalized query string.
+
+    Args:
+        text (str): The user's query.
+
+    Returns:
+        np.ndarray: The normalized query embedding (read-only, float32).
+    """
+    key = text.strip().lower()
+    return _embed_normalized_query(key)
 
 class IngestService:
     """
@@ -31,8 +114,72 @@ class IngestService:
             chunk_overlap=200,
             length_function=len,
             is_separator_regex=False,
+            # Record each chunk's character offset so it can be mapped back to its page
+            add_start_index=True,
         )
 
+    def _extract_pages(self, file_path: str) -> List[Dict[str, Any]]:
+        """
+        Synchronously extracts the text of each non-empty page of a PDF.
+
+        Args:
+            file_path (str): The absolute path to the PDF file.
+
+        Returns:
+            List[Dict[str, Any]]: One entry per page with its 'text' and 1-based 'page_number'.
+        """
+        pages = []
+        # PDFium is not thread-safe, and extraction runs in worker threads, so
+        # concurrent uploads must not touch the library at the same time.
+        with _pdfium_lock:
+            pdf = pdfium.PdfDocument(file_path)
+            try:
+                for i, page in enumerate(pdf):
+                    textpage = page.get_textpage()
+                    # PDFium ends lines with "\r\n"; normalize so the splitter's "\n\n" separator matches
+                    text = textpage.get_text_range().replace("\r\n", "\n")
+                    if text:
+                        pages.append({"text": text, "page_number": i + 1})
+                    textpage.close()
+                    page.close()
+            finally:
+                pdf.close()
+        return pages
+
+    def _embed_texts(self, texts: List[str]) -> np.ndarray:
+        """
+        Synchronously generates embeddings for a list of texts, reusing cached vectors.
+
+        Only texts whose SHA-256 digest is not already in the embedding cache are
+        encoded; the new vectors are then written back to the cache.
+
+        Args:
+            texts (List[str]): The texts to embed.
+
+        Returns:
+            np.ndarray: A float32 array of shape (len(texts), dim).
+        """
+        keys = [hashlib.sha256(t.encode()).digest() for t in texts]
+        cached = [embedding_cache.get(key) for key in keys]
+        miss_idx = [i for i, value in enumerate(cached) if value is None]
+
+        if miss_idx:
+            new_vectors = embedding_model.encode(
+                [texts[i] for i in miss_idx],
+                batch_size=64,
+                show_progress_bar=False,
+                convert_to_numpy=True,
+                normalize_embeddings=False,
+            )
+            with embedding_cache.transact():
+                for i, vec in zip(miss_idx, new_vectors):
+                    cached[i] = np.asarray(vec, dtype=np.float16).tobytes()
+                    embedding_cache.set(keys[i], cached[i])
+
+        # Fresh and cached vectors are both decoded from their FP16 form, so the
+        # same text always yields the same vector regardless of cache state
+        return np.stack([np.frombuffer(value, dtype=np.float16) for value in cached]).astype(np.float32)
+
     async def process_pdf(self, file_path: str, filename: str) -> List[TextChunk]:
         """
         Processes a PDF file: extracts text, splits it into chunks, and generates embeddings.
@@ -44,53 +191,65 @@ class IngestService:
         Returns:
             List[TextChunk]: A list of processed text chunks with metadata and embeddings.
         """
-        text_content = ""
-        pages = []
-        
         # 1. Extract Text from PDF
+        # PDF parsing is CPU-bound, so it runs in a worker thread to keep the event loop free.
         try:
-            reader = pypdf.PdfReader(file_path)
-            for i, page in enumerate(reader.pages):
-                text = page.extract_text()
-                if text:
-                    pages.append({"text": text, "page_number": i + 1})
-                    text_content += text + "\n"
+            pages = await asyncio.to_thread(self._extract_pages, file_path)
         except Exception as e:
             # Log the error and return empty list if extraction fails
             print(f"Error reading PDF {filename}: {str(e)}")
             return []
 
         # 2. Split Text into Chunks
-        # We iterate through pages to maintain accurate page number metadata.
-        # This is critical for legal documents where citation is important.
-        
-        chunks: List[TextChunk] = []
-        
+        # The whole document is split in a single pass. Each chunk's start offset is
+        # mapped back to its page via the page start offsets to keep accurate page
+        # number metadata. This is critical for legal documents where citation is important.
+        page_starts: List[int] = []
+        offset = 0
         for page in pages:
-            page_chunks = self.text_splitter.split_text(page["text"])
-            for chunk_text in page_chunks:
-                # Future enhancement: Extract dates and entities using NER or LLM
-                
-                metadata = DocumentMetadata(
-                    source=file_path,
-                    filename=filename,
-                    page_number=page["page_number"],
-                    dates=[], # Placeholder for extracted dates
-                    entities=[] # Placeholder for extracted entities
-                )
-                
-                chunk_id = str(uuid.uuid4())
-                
-                # 3. Generate Vector Embedding
-                embedding = embedding_model.encode(chunk_text).tolist()
-                
-                chunks.append(TextChunk(
-                    text=chunk_text,
-                    metadata=metadata,
-                    chunk_id=chunk_id,
-                    embedding=embedding
-                ))
-                
+            page_starts.append(offset)
+            offset += len(page["text"]) + 1  # +1 for the joining newline
+        full_text = "\n".join(page["text"] for page in pages)
+
+        chunk_texts: List[str] = []
+        chunk_pages: List[int] = []
+
+        for doc in self.text_splitter.create_documents([full_text], metadatas=[{"filename": filename}]):
+            page_idx = bisect.bisect_right(page_starts, doc.metadata["start_index"]) - 1
+            chunk_texts.append(doc.page_content)
+            chunk_pages.append(pages[page_idx]["page_number"])
+
+        if not chunk_texts:
+            return []
+
+        # 3. Generate Vector Embeddings
+        # All chunks are encoded in a single batched call so the model can pad
+        # length-sorted batches instead of running one sequence at a time.
+        embeddings = await asyncio.to_thread(self._embed_texts, chunk_texts)
+
+        chunks: List[TextChunk] = []
+
+        for chunk_text, page_number, emb in zip(chunk_texts, chunk_pages, embeddings):
+            # Future enhancement: Extract dates and entities using NER or LLM
+
+            metadata = DocumentMetadata(
+                source=file_path,
+                filename=filename,
+                page_number=page_number,
+                dates=[], # Placeholder for extracted dates
+                entities=[] # Placeholder for extracted entities
+            )
+
+            # Deterministic ID: re-uploading a document overwrites its chunks instead of duplicating them
+            chunk_id = str(uuid.uuid5(CHUNK_ID_NAMESPACE, f"{filename}\x00{page_number}\x00{chunk_text}"))
+
+            chunks.append(TextChunk(
+                text=chunk_text,
+                metadata=metadata,
+                chunk_id=chunk_id,
+                embedding=emb
+            ))
+
         return chunks
 
 # Global instance of the ingestion service
@@ -2,65 +2,148 @@
 LLM Integration Service
 
 This module manages interactions with the Google Gemini API.
-It provides functionality for metadata extraction (dates, entities) and
+It provides functionality for batched metadata extraction (dates, entities) and
 retrieval-augmented generation (RAG) for answering user queries based on document context.
 """
 
 import google.generativeai as genai
 from app.core.config import settings
+from app.services.tokenizer import truncate_to_tokens
 import json
-from typing import List, Dict, Any
+import asyncio
+import functools
+import hashlib
+import diskcache
+from typing import List, Dict, Any, AsyncIterator
+
+# Token budget for each text segment sent for metadata extraction
+METADATA_MAX_TOKENS = 1500
+
+# Response schema for metadata extraction: one id-keyed object per input segment
+METADATA_BATCH_SCHEMA = {
+    "type": "array",
+    "items": {
+        "type": "object",
+        "properties": {
+            "id": {"type": "integer"},
+            "dates": {"type": "array", "items": {"type": "string"}},
+            "entities": {"type": "array", "items": {"type": "string"}},
+        },
+        "required": ["id", "dates", "entities"],
+    },
+}
+
+# Persistent cache of LLM responses, so repeated prompts skip the API round-trip
+llm_cache = diskcache.Cache(settings.LLM_CACHE_DIR)
+
+def _cache_key(*parts: Any) -> str:
+    return hashlib.sha256(repr(parts).encode()).hexdigest()
+
+def _llm_cache(fn):
+    """
+    Caches the result of an LLM coroutine on disk, keyed by a hash of its arguments.
+
+    Calls that raise are not cached, so transient API errors are retried next time.
+    """
+    @functools.wraps(fn)
+    async def wrap(self, *args, **kwargs):
+        key = _cache_key(fn.__name__, args, kwargs)
+        cached = llm_cache.get(key)
+        if cached is not None:
+            return cached
+        value = await fn(self, *args, **kwargs)
+        llm_cache.set(key, value, expire=settings.LLM_CACHE_TTL)
+        return value
+    return wrap
 
 class LLMService:
     """
     Service class for interacting with the Google Gemini Large Language Model.
     """
     def __init__(self):
+        # Bounds concurrent metadata requests so large documents don't trip API rate limits
+        self.llm_semaphore = asyncio.Semaphore(settings.LLM_MAX_CONCURRENCY)
+
         # Initialize the Gemini client if the API key is available
         if settings.GEMINI_API_KEY:
             genai.configure(api_key=settings.GEMINI_API_KEY)
             # Use 'gemini-1.5-flash' for a good balance of speed and capability
             self.model = genai.GenerativeModel('gemini-1.5-flash')
+            # Metadata calls use JSON mode with a schema, so the response is always parseable JSON
+            self.metadata_batch_config = genai.GenerationConfig(
+                response_mime_type="application/json",
+                response_schema=METADATA_BATCH_SCHEMA,
+            )
         else:
             print("Warning: GEMINI_API_KEY not set. LLM features will be disabled.")
             self.model = None
 
-    async def extract_metadata(self, text: str) -> Dict[str, Any]:
+    @_llm_cache
+    async def _generate(self, prompt: str, generation_config: genai.GenerationConfig = None) -> str:
         """
-        Extracts structured metadata (dates, entities) from a given text segment using the LLM.
+        Sends a prompt to the LLM and returns the response text (cached by prompt and config).
+        """
+        response = await self.model.generate_content_async(prompt, generation_config=generation_config)
+        return response.text
+
+    async def extract_metadata_batch(self, texts: List[str], batch_size: int = 8) -> List[Dict[str, Any]]:
+        """
+        Extracts metadata for many text segments, folding several segments into each LLM call.
+
+        Segments are grouped into batches of `batch_size`; each batch is sent as a single
+        prompt and up to LLM_MAX_CONCURRENCY batches are requested concurrently.
 
         Args:
-            text (str): The text content to analyze.
+            texts (List[str]): The text contents to analyze.
+            batch_size (int): The number of segments sent in a single prompt.
 
         Returns:
-            Dict[str, Any]: A dictionary containing lists of extracted 'dates' and 'entities'.
+            List[Dict[str, Any]]: One metadata dictionary per input text, in the same order.
         """
         if not self.model:
-            return {"dates": [], "entities": []}
+            return [{"dates": [], "entities": []} for _ in texts]
+
+        batches = [texts[i:i + batch_size] for i in range(0, len(texts), batch_size)]
+        results = await asyncio.gather(*(self._extract_metadata_group(batch) for batch in batches))
+        return [metadata for batch_results in results for metadata in batch_results]
 
+    async def _extract_metadata_group(self, texts: List[str]) -> List[Dict[str, Any]]:
+        """
+        Extracts metadata for a group of text segments with a single LLM call.
+        """
+        items = [{"id": i, "text": truncate_to_tokens(text, METADATA_MAX_TOKENS)} for i, text in enumerate(texts)]
         prompt = f"""
-        Extract the following metadata from the legal text below. Return ONLY a valid JSON object.
+        Extract the following metadata from each legal text in the JSON array below.
+        Return a JSON array with one object per input, carrying the input's "id".
         1. "dates": A list of all specific dates mentioned (YYYY-MM-DD format if possible, or original text).
         2. "entities": A list of important entities (companies, people, jurisdictions) mentioned.
 
-        Text:
-        {text[:2000]} 
-        """ 
-        # Note: We truncate text to 2000 chars to avoid token limits and focus on the most relevant content for metadata.
+        Texts:
+        {json.dumps(items, ensure_ascii=False)}
+        """
 
+        results = [{"dates": [], "entities": []} for _ in texts]
         try:
-            response = self.model.generate_content(prompt)
-            # Clean up the response to ensure valid JSON parsing
-            content = response.text.replace("```json", "").replace("```", "").strip()
-            return json.loads(content)
+            async with self.llm_semaphore:
+                content = await self._generate(prompt, generation_config=self.metadata_batch_config)
+            # Scatter the results back to their input positions by id
+            for item in json.loads(content):
+                idx = item.get("id")
+                if isinstance(idx, int) and 0 <= idx < len(texts):
+                    results[idx] = {
+                        "dates": item.get("dates", []),
+                        "entities": item.get("entities", []),
+                    }
         except Exception as e:
-            print(f"LLM Extraction Error: {str(e)}")
-            return {"dates": [], "entities": []}
+            print(f"LLM Batch Extraction Error: {str(e)}")
+        return results
 
     async def synthesize_answer(self, query: str, context_chunks: List[str]) -> str:
         """
         Generates a natural language answer to a user query based on provided context chunks.
 
+        This collects the full output of `synthesize_answer_stream`.
+
         Args:
             query (str): The user's question.
             context_chunks (List[str]): Relevant text segments retrieved from the vector database.
@@ -68,8 +151,28 @@ class LLMService:
         Returns:
             str: The generated answer or an error message.
         """
+        try:
+            return "".join([text async for text in self.synthesize_answer_stream(query, context_chunks)])
+        except Exception as e:
+            return f"Error generating answer: {str(e)}"
+
+    async def synthesize_answer_stream(self, query: str, context_chunks: List[str]) -> AsyncIterator[str]:
+        """
+        Streams a natural language answer to a user query as text deltas, as soon as the LLM emits them.
+
+        Args:
+            query (str): The user's question.
+            context_chunks (List[str]): Relevant text segments retrieved from the vector database.
+
+        Yields:
+            str: Successive pieces of the generated answer.
+
+        Raises:
+            Exception: If the LLM call fails, possibly after some pieces were yielded.
+        """
         if not self.model:
-            return "LLM service not configured."
+            yield "LLM service not configured."
+            return
         
         context_str = "\n\n".join(context_chunks)
         prompt = f"""
@@ -84,15 +187,21 @@ class LLMService:
         Answer:
         """
         
-        try:
-            # Use streaming to potentially improve perceived latency (though we collect full response here)
-            response = self.model.generate_content(prompt, stream=True)
-            full_response = ""
-            for chunk in response:
-                full_response += chunk.text
-            return full_response
-        except Exception as e:
-            return f"Error generating answer: {str(e)}"
+        # A previously completed answer to the same prompt is replayed from the cache
+        key = _cache_key("synthesize_answer", prompt)
+        cached = llm_cache.get(key)
+        if cached is not None:
+            yield cached
+            return
+
+        parts = []
+        response = await self.model.generate_content_async(prompt, stream=True)
+        async for chunk in response:
+            parts.append(chunk.text)
+            yield chunk.text
+
+        # Only answers that streamed to completion are cached
+        llm_cache.set(key, "".join(parts), expire=settings.LLM_CACHE_TTL)
 
 # Global instance of the LLM service
 llm_service = LLMService()
@@ -6,11 +6,13 @@ It manages the storage (upsert) and retrieval (semantic search) of document chun
 and their associated metadata.
 """
 
+import asyncio
+import numpy as np
 from qdrant_client import QdrantClient
 from qdrant_client.http import models
 from app.core.config import settings
 from app.models.document import TextChunk
-from typing import List
+from typing import List, Optional, Union, Iterator
 
 class MemoryService:
     """
@@ -25,17 +27,52 @@ class MemoryService:
     def _ensure_collection(self):
         """
         Checks if the vector collection exists, and creates it if not.
-        Configures the vector size (768 for all-mpnet-base-v2) and distance metric (Cosine).
+        Configures the vector size (768 for all-mpnet-base-v2) and distance metric (Cosine),
+        and indexes the payload fields used for server-side filtering.
+        Vectors are stored with int8 scalar quantization kept in RAM for faster search.
         """
+        quantization_config = models.ScalarQuantization(
+            scalar=models.ScalarQuantizationConfig(type=models.ScalarType.INT8, always_ram=True)
+        )
         try:
-            self.client.get_collection(self.collection_name)
+            collection = self.client.get_collection(self.collection_name)
         except Exception:
             # Collection doesn't exist, create it
+            collection = None
             self.client.create_collection(
                 collection_name=self.collection_name,
                 vectors_config=models.VectorParams(size=768, distance=models.Distance.COSINE),
+                quantization_config=quantization_config,
             )
 
+        if collection is not None and collection.config.quantization_config is None:
+            # Existing collection created before quantization was enabled.
+            # Search still works unquantized, so a failed update must not stop startup.
+            try:
+                self.client.update_collection(
+                    collection_name=self.collection_name,
+                    quantization_config=quantization_config,
+                )
+            except Exception as e:
+                print(f"Warning: could not enable quantization on {self.collection_name}: {str(e)}")
+
+        # Payload indexes (creating an existing index is a no-op)
+        self.client.create_payload_index(
+            collection_name=self.collection_name,
+            field_name="dates",
+            field_schema=models.PayloadSchemaType.KEYWORD,
+        )
+        self.client.create_payload_index(
+            collection_name=self.collection_name,
+            field_name="filename",
+            field_schema=models.PayloadSchemaType.KEYWORD,
+        )
+        self.client.create_payload_index(
+            collection_name=self.collection_name,
+            field_name="created_at",
+            field_schema=models.PayloadSchemaType.DATETIME,
+        )
+
     async def upsert_chunks(self, chunks: List[TextChunk]):
         """
         Inserts or updates document chunks in the vector database.
@@ -43,45 +80,95 @@ class MemoryService:
         Args:
             chunks (List[TextChunk]): List of processed text chunks to store.
         """
-        points = []
-        for chunk in chunks:
-            # Create a PointStruct for each chunk, including vector and metadata payload
-            points.append(models.PointStruct(
-                id=chunk.chunk_id,
-                vector=chunk.embedding,
-                payload={
-                    "text": chunk.text,
-                    "filename": chunk.metadata.filename,
-                    "page_number": chunk.metadata.page_number,
-                    "source": chunk.metadata.source,
-                    "created_at": chunk.metadata.created_at.isoformat(),
-                    "dates": chunk.metadata.dates,
-                    "entities": chunk.metadata.entities
-                }
-            ))
-        
-        if points:
-            self.client.upsert(
+        if not chunks:
+            return
+
+        ids = [chunk.chunk_id for chunk in chunks]
+        vectors = np.stack([chunk.embedding for chunk in chunks]).astype(np.float32)
+        payloads = [
+            {
+                "text": chunk.text,
+                "filename": chunk.metadata.filename,
+                "page_number": chunk.metadata.page_number,
+                "source": chunk.metadata.source,
+                "created_at": chunk.metadata.created_at.isoformat(),
+                "dates": chunk.metadata.dates,
+                "entities": chunk.metadata.entities
+            }
+            for chunk in chunks
+        ]
+
+        # Upload in batches without waiting for indexing. Parallel upload spawns a pool of
+        # worker processes, which only pays off when there are more batches than workers.
+        # The upload itself is blocking, so it runs in a worker thread.
+        batch_size = 64
+        parallel = 4 if len(ids) > batch_size * 4 else 1
+        try:
+            await asyncio.to_thread(
+                self.client.upload_collection,
                 collection_name=self.collection_name,
-                points=points
+                vectors=vectors,
+                payload=payloads,
+                ids=ids,
+                batch_size=batch_size,
+                parallel=parallel,
+                wait=False
             )
+        except Exception as e:
+            print(f"Error uploading {len(ids)} chunks to {self.collection_name}: {str(e)}")
+            raise
             
-    async def search(self, query_vector: List[float], limit: int = 5) -> List[models.ScoredPoint]:
+    def scroll_all(
+        self,
+        scroll_filter: Optional[models.Filter] = None,
+        with_payload: Union[bool, List[str]] = True,
+        batch_size: int = 512
+    ) -> Iterator[models.Record]:
+        """
+        Iterates over every point matching a filter, following Qdrant's scroll cursor page by page.
+
+        Args:
+            scroll_filter (Optional[models.Filter]): Condition the points must satisfy.
+            with_payload (Union[bool, List[str]]): Whether to return payloads, or which payload fields.
+            batch_size (int): The number of points fetched per request.
+
+        Yields:
+            models.Record: Each matching point.
+        """
+        next_page = None
+        while True:
+            points, next_page = self.client.scroll(
+                collection_name=self.collection_name,
+                scroll_filter=scroll_filter,
+                limit=batch_size,
+                offset=next_page,
+                with_payload=with_payload
+            )
+            yield from points
+            if next_page is None:
+                break
+
+    async def search(self, query_vector: np.ndarray, limit: int = 5) -> List[models.ScoredPoint]:
         """
         Performs a semantic search in the vector database.
 
         Args:
-            query_vector (List[float]): The embedding vector of the search query.
+            query_vector (np.ndarray): The embedding vector of the search query.
             limit (int): The maximum number of results to return.
 
         Returns:
             List[models.ScoredPoint]: A list of scored points (matches) from the database.
         """
-        return self.client.search(
+        return self.client.query_points(
             collection_name=self.collection_name,
-            query_vector=query_vector,
-            limit=limit
-        )
+            query=query_vector,
+            limit=limit,
+            with_payload=True,
+            # Oversample on the quantized vectors, then rescore with the originals to recover accuracy
+            search_params=models.SearchParams(
+                quantization=models.QuantizationSearchParams(rescore=True, oversampling=2.0)
+            )
+        ).points
 
 # Global instance of the memory service
 memory_service = MemoryService()
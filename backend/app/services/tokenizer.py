@@ -0,0 +1,36 @@
+"""
+Tokenizer Service
+
+This module provides the embedding model's fast tokenizer on its own, without
+loading the model weights. It is shared by services that need token-accurate
+text budgets (e.g., LLM prompt construction).
+"""
+
+from transformers import AutoTokenizer
+
+# 'all-mpnet-base-v2' is a high-performing model for semantic search
+EMBEDDING_MODEL_NAME = 'all-mpnet-base-v2'
+
+# Fast (Rust) tokenizer of the embedding model
+tokenizer = AutoTokenizer.from_pretrained(f"sentence-transformers/{EMBEDDING_MODEL_NAME}")
+
+def truncate_to_tokens(text: str, max_tokens: int) -> str:
+    """
+    Truncates text to at most `max_tokens` tokens of the embedding model's tokenizer.
+
+    The cut is made at the character offset of the last kept token, so the
+    original text (whitespace, casing) is preserved.
+
+    Args:
+        text (str): The text to truncate.
+        max_tokens (int): The maximum number of tokens to keep.
+
+    Returns:
+        str: The truncated text.
+    """
+    offsets = tokenizer(
+        text, add_special_tokens=False, return_offsets_mapping=True
+    )["offset_mapping"]
+    if len(offsets) <= max_tokens:
+        return text
+    return text[:offsets[max_tokens - 1][1]]